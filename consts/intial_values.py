@@ -3,4 +3,6 @@ from .palm_detector_enum import PalmDetectorEnum
 from .keypoint_estimator_enum import KeypointEstimatorEnum
 
 KEYPOINT_EST = KeypointEstimatorEnum.NONE
-PALM_DET = PalmDetectorEnum.YOLO
\ No newline at end of file
+PALM_DET = PalmDetectorEnum.YOLO
+# run BlazePalm on the TFLite GPU delegate, falls back to the CPU if unavailable
+USE_GPU = False
\ No newline at end of file
@@ -20,12 +20,23 @@ class GUI:
             "keypoint_estimator_combo")
         dpg.configure_item(
             "palm_detector_combo", show=self.model.keypoint_estimator.requires_detector)
+        dpg.configure_item(
+            "palm_detector_device", show=self.model.keypoint_estimator.requires_detector)
+        self.update_palm_detector_device()
 
     def hand_det_callback(self, sender, app_data, user_data):
         """
         Changes which hand detection method is used
         """
         self.model.load_palm_detector(PalmDetectorEnum[app_data])
+        self.update_palm_detector_device()
+
+    def update_palm_detector_device(self):
+        """
+        Shows whether the selected hand detector runs on the CPU or GPU
+        """
+        dpg.set_value("palm_detector_device",
+                      f"Hand detector running on: {self.model.palm_detector_device}")
 
     def render_loop(self):
         """
@@ -36,5 +47,5 @@ class GUI:
             self.view.update_main_frame(frame)
             if cropped is not None:
                 self.view.update_cropped_frame(cropped)
-        self.model.cap.release()
+        self.model.release()
         dpg.destroy_context()
@@ -1,4 +1,6 @@
 import cv2
+import threading
+import time
 import numpy as np
 from typing import Tuple
 # consts
@@ -13,6 +15,13 @@ from pose_estimators.meshformer import MeshFormer
 from pose_estimators.identity import Identity
 from pose_estimators.mediapipe_estimator import MediaPipeE2E
 
+# seconds to wait before grabbing again after the camera failed to return a frame
+GRAB_RETRY_DELAY = 0.05
+# consecutive failed grabs (~1s) after which the camera is considered gone
+MAX_GRAB_FAILURES = 20
+# max seconds the render loop waits for a new camera frame before redrawing the last result
+FRAME_WAIT_TIMEOUT = 0.1
+
 class Model:
     def __init__(self):
         self.load_keypoint_estimator(intial_values.KEYPOINT_EST)
@@ -33,29 +42,111 @@ class Model:
         if palm_detector == PalmDetectorEnum.YOLO:
             self.palm_detector = YOLO()
         else:
-            self.palm_detector = BlazePalm()
+            self.palm_detector = BlazePalm(use_gpu=intial_values.USE_GPU)
+
+    @property
+    def palm_detector_device(self) -> str:
+        """
+        Where the palm detector runs, only BlazePalm can use the GPU.
+        """
+        return "GPU" if getattr(self.palm_detector, 'use_gpu', False) else "CPU"
 
     def init_camera(self) -> Tuple[int,int]:
         """
-        Initilizes the Camera.
+        Initilizes the Camera and starts grabbing its frames in the background.
         Returns its capture (width, height) -> useful when initializing windows.
         """
         self.cap = cv2.VideoCapture(0)
+        # compressed MJPG frames need a fraction of YUYV's USB bandwidth
+        if not self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG')):
+            print("Warning: camera doesn't support MJPG, using its default format")
+        # keep only the newest frame queued so reads don't return stale frames
+        if not self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1):
+            print("Warning: couldn't limit the camera buffer to 1 frame")
         ret, frame = self.cap.read()
         assert ret
+        # single slot holding the newest decoded frame, older ones are dropped.
+        # Its sequence number lets the render loop tell new frames apart
+        self._latest = frame
+        self._frame_seq = 1
+        self._new_frame = threading.Condition()
+        self._last_seq = 0
+        self._last_result = None
+        self._frame_requested = threading.Event()
+        self._capturing = True
+        self._capture_error = None
+        self._grab_thread = threading.Thread(target=self._grab_loop, daemon=True)
+        self._grab_thread.start()
         width, height = frame.shape[1], frame.shape[0]
         return width, height
 
+    def _grab_loop(self) -> None:
+        """
+        Keeps draining the camera queue so it never holds stale frames.
+        Frames are only decoded when get_new_annotated_frame has asked for one.
+        Stops and records an error if the camera keeps failing to return frames.
+        """
+        failures = 0
+        while self._capturing:
+            if not self.cap.grab():
+                failures += 1
+                if failures >= MAX_GRAB_FAILURES:
+                    self._capture_error = "Camera stopped returning frames (unplugged or stream ended)"
+                    return
+                time.sleep(GRAB_RETRY_DELAY)
+                continue
+            failures = 0
+            if self._frame_requested.is_set():
+                ret, frame = self.cap.retrieve()
+                if ret:
+                    self._frame_requested.clear()
+                    with self._new_frame:
+                        self._latest = frame
+                        self._frame_seq += 1
+                        self._new_frame.notify_all()
+
+    def release(self) -> None:
+        """
+        Stops the capture thread and releases the camera.
+        """
+        self._capturing = False
+        # grab() can block on a stuck camera, the thread is a daemon so don't wait forever
+        self._grab_thread.join(timeout=1)
+        if self._grab_thread.is_alive():
+            # VideoCapture isn't thread safe, releasing it under a running grab() would
+            # free it while still in use. The daemon thread dies with the process instead
+            print("Warning: camera thread didn't stop, leaving the camera to be closed on exit")
+            return
+        self.cap.release()
+
     def get_new_annotated_frame(self) -> Tuple[np.ndarray, np.ndarray]:
         """
         Retrieves new frame from webcam.
         Runs the selected model on that frame.
         Returns frame with keypoints drawn on it.
+        Frames are kept in the camera's BGR order, conversion happens only when drawing.
+        Waits briefly for a new frame, if none arrives the previous result is returned
+        so the models never run twice on the same frame.
+        """
+        # 1. ask for the next video frame and wait for it to be decoded
+        if self._capture_error is not None:
+            raise RuntimeError(self._capture_error)
+        self._frame_requested.set()
+        with self._new_frame:
+            self._new_frame.wait_for(lambda: self._frame_seq != self._last_seq,
+                                     timeout=FRAME_WAIT_TIMEOUT)
+            frame, seq = self._latest, self._frame_seq
+        if seq == self._last_seq:
+            return self._last_result
+        self._last_seq = seq
+        self._last_result = self._annotate_frame(frame)
+        return self._last_result
+
+    def _annotate_frame(self, frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Runs the selected model on a single frame.
+        Returns (frame with keypoints drawn on it, cropped hand).
         """
-        # 1. get a new video frame
-        ret, frame = self.cap.read()
-        assert ret
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         # 2. if model requires it crop a hand before estimation
         if self.keypoint_estimator.requires_detector:
             hand_bbox = self.palm_detector(frame)
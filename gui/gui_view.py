@@ -6,6 +6,12 @@ from consts.palm_detector_enum import PalmDetectorEnum
 
 class View:
     def __init__(self, video_width, video_height, keypoint_estimator_callback, hand_det_callback):
+        # textures are rewritten in place every frame instead of being reallocated
+        self._frame_rgba = np.empty((video_height, video_width, 4), dtype=np.uint8)
+        self._frame_texture = np.empty(video_height * video_width * 4, dtype=np.float32)
+        self._cropped_small = np.empty((256, 256, 3), dtype=np.uint8)
+        self._cropped_rgba = np.empty((256, 256, 4), dtype=np.uint8)
+        self._cropped_texture = np.empty(256 * 256 * 4, dtype=np.float32)
         dpg.create_context()
         # dpg.configure_app(docking=True, docking_space=True)
         dpg.create_viewport(title="Hand Tracking Demo")
@@ -25,18 +31,19 @@ class View:
                           width=250, tag='keypoint_estimator_combo', callback=keypoint_estimator_callback)
             dpg.add_combo([k.name for k in PalmDetectorEnum], default_value=str(list(PalmDetectorEnum)[0]),
                           width=250, tag='palm_detector_combo', callback=hand_det_callback, show=False)
+            dpg.add_text("", tag='palm_detector_device', show=False)
         dpg.show_viewport()
         dpg.set_primary_window('main_window', False)
 
     def update_main_frame(self, new_frame):
-        frame = cv2.cvtColor(new_frame, cv2.COLOR_RGB2RGBA)
-        frame = np.array(frame, dtype=np.float32).ravel()/255
-        dpg.set_value("frame", frame)
+        cv2.cvtColor(new_frame, cv2.COLOR_BGR2RGBA, dst=self._frame_rgba)
+        np.multiply(self._frame_rgba.ravel(), np.float32(1 / 255), out=self._frame_texture)
+        dpg.set_value("frame", self._frame_texture)
         dpg.render_dearpygui_frame()
 
     def update_cropped_frame(self, new_frame):
-        frame = cv2.cvtColor(new_frame, cv2.COLOR_RGB2RGBA)
-        frame = cv2.resize(frame, (256, 256))
-        frame = np.array(frame, dtype=np.float32).ravel()/255
-        dpg.set_value("cropped_frame", frame)
+        cv2.resize(new_frame, (256, 256), dst=self._cropped_small)
+        cv2.cvtColor(self._cropped_small, cv2.COLOR_BGR2RGBA, dst=self._cropped_rgba)
+        np.multiply(self._cropped_rgba.ravel(), np.float32(1 / 255), out=self._cropped_texture)
+        dpg.set_value("cropped_frame", self._cropped_texture)
         dpg.render_dearpygui_frame()
\ No newline at end of file
@@ -1,21 +1,35 @@
 # Implementation taken from https://github.dev/aashish2000/hand_tracking
 import csv
 import cv2
+import math
 import os
+import sys
 import numpy as np
 import tensorflow as tf
 
 if __name__ != "__main__":
-    from .dependencies.non_maximum_suppression import non_max_suppression_fast
     PARENT_PATH = os.path.join("hand_detectors", "blazepalm")
 else:
-    from dependencies.non_maximum_suppression import non_max_suppression_fast
     PARENT_PATH = '.'
 
 TFLITE_PATH = os.path.join(PARENT_PATH, 'dependencies',
                            'palm_detection_without_custom_op.tflite')
 ANCHOR_PATH = os.path.join(PARENT_PATH, 'dependencies', 'anchors.csv')
+# OpenCL/OpenGL delegate on Linux, Metal backed one on macOS
+GPU_DELEGATE_PATH = 'libtensorflowlite_gpu_delegate.dylib' if sys.platform == 'darwin'\
+    else 'libtensorflowlite_gpu_delegate.so'
 CONFINDENCE_THRESHOLD = 0.5
+# sigmoid is monotonic, so thresholding the raw scores by logit(threshold)
+# is equivalent to thresholding the probabilities
+CONFINDENCE_LOGIT_THRESHOLD = np.log(CONFINDENCE_THRESHOLD / (1 - CONFINDENCE_THRESHOLD))
+# previous bbox is reused only if it was detected with at least this confidence
+TRACKING_THRESHOLD = 0.8
+# mean absolute pixel difference (0-255) inside the cached bbox that counts as the hand
+# having moved, well above camera noise (~2-4) while a hand moving by a fraction of its
+# width changes a large share of the region's pixels by tens of levels
+MOTION_THRESHOLD = 10
+# approximate number of samples per side taken from the cached bbox for the motion check
+ROI_SAMPLES = 32
 
 class BlazePalm():
     r"""
@@ -27,6 +41,13 @@ class BlazePalm():
         palm_model: path to the palm_detection.tflite
         joint_model: path to the hand_landmark.tflite
         anchors_path: path to the csv containing SSD anchors
+        model_path: palm detection model to load, e.g. a float16 quantized variant
+            of palm_detection_without_custom_op.tflite (float32 inputs/outputs required)
+        num_threads: number of CPU threads used by the TFLite (XNNPACK) kernels
+        use_gpu: try running the palm model on the TFLite GPU delegate,
+            falls back to the CPU if the delegate can't be created
+        redetect_interval: max number of frames a confident detection is reused for
+        debug: return the detection candidates from detect_hand
     Ourput:
         (21,2) array of hand joints.
     Examples::
@@ -35,12 +56,22 @@ class BlazePalm():
         >>> keypoints, bbox = det(input_img)
     """
 
-    def __init__(self, box_enlarge=1.5, box_shift=0.2):
+    def __init__(self, box_enlarge=1.5, box_shift=0.2, model_path=TFLITE_PATH,
+                 num_threads=os.cpu_count(), use_gpu=False, redetect_interval=10, debug=False):
         self.box_shift = box_shift
         self.box_enlarge = box_enlarge
+        self.redetect_interval = redetect_interval
+        self.debug = debug
 
-        self.interp_palm = tf.lite.Interpreter(TFLITE_PATH)
-        self.interp_palm.allocate_tensors()
+        # detection cache used to skip the palm model on frames where
+        # the hand is (most likely) still inside the previous bbox
+        self.last_bbox = None
+        self.last_confidence = 0.
+        self._last_roi = None
+        self._last_patch = None
+        self._frames_since_detection = 0
+
+        self.interp_palm, self.use_gpu = self._load_interpreter(model_path, num_threads, use_gpu)
 
         # reading the SSD anchors
         with open(ANCHOR_PATH, 'r') as csv_f:
@@ -55,8 +86,24 @@ class BlazePalm():
         self.out_reg_idx = output_details[0]['index']
         self.out_clf_idx = output_details[1]['index']
 
-        # 90° rotation matrix used to create the alignment trianlge
-        self.R90 = np.r_[[[0, 1], [-1, 0]]]
+        # zero-copy handles to the interpreter's own input/output buffers,
+        # the returned views must not be alive while invoke() runs
+        self._in_tensor = self.interp_palm.tensor(self.in_idx)
+        self._reg_tensor = self.interp_palm.tensor(self.out_reg_idx)
+        self._clf_tensor = self.interp_palm.tensor(self.out_clf_idx)
+        # float16 quantized models keep float32 I/O, fully int8 ones would need
+        # their inputs/outputs (de)quantized which isn't supported
+        if any(d['dtype'] != np.float32 for d in input_details + output_details):
+            raise ValueError(f"{model_path} must have float32 inputs and outputs")
+        # letterboxed frame, reused between frames
+        self._resize_buf = np.empty((256, 256, 3), dtype=np.uint8)
+
+        # alignment triangle, filled in by _get_triangle on every detection
+        self._triangle_buf = np.empty((3, 2), dtype=np.float32)
+        # anchor centres in input tensor pixels and scratch buffers for the keypoint decode
+        self._anchor_centers = np.float32(self.anchors[:, :2] * 256)
+        self._kp_buf = np.empty((7, 2), dtype=np.float32)
+        self._shift_buf = np.empty(2, dtype=np.float32)
 
         # triangle target coordinates used to move the detected hand
         # into the right position
@@ -66,52 +113,94 @@ class BlazePalm():
             [0, 128]
         ])
         self._target_box = np.float32([
-            [0,   0, 1],
-            [256,   0, 1],
-            [256, 256, 1],
-            [0, 256, 1],
+            [0,   0],
+            [256,   0],
+            [256, 256],
+            [0, 256],
         ])
 
+    @staticmethod
+    def _load_interpreter(model_path, num_threads, use_gpu):
+        """
+        Builds the palm detection interpreter once, so it can be reused for every frame.
+        Returns (interpreter, whether it runs on the GPU delegate).
+        """
+        if use_gpu:
+            try:
+                gpu_delegate = tf.lite.experimental.load_delegate(GPU_DELEGATE_PATH)
+                # ops the delegate rejects still run on the CPU, keep those multi-threaded
+                interp = tf.lite.Interpreter(model_path=model_path,
+                                             experimental_delegates=[gpu_delegate],
+                                             num_threads=num_threads)
+                interp.allocate_tensors()
+                return interp, True
+            except (ValueError, RuntimeError) as e:
+                print("Couldn't use the GPU delegate, falling back to the CPU:", e)
+        # XNNPACK is applied by default to float models, num_threads lets its
+        # kernels run on all cores instead of a single one
+        interp = tf.lite.Interpreter(model_path=model_path,
+                                     num_threads=num_threads)
+        interp.allocate_tensors()
+        return interp, False
+
     def _get_triangle(self, kp0, kp2, dist=1):
-        """get a triangle used to calculate Affine transformation matrix"""
-        dir_v = kp2 - kp0
-        dir_v /= np.linalg.norm(dir_v)
-        dir_v_r = dir_v @ self.R90.T
-        return np.float32([kp2, kp2+dir_v*dist, kp2 + dir_v_r*dist])
+        """
+        get a triangle used to calculate Affine transformation matrix.
+        The returned (3,2) array is a buffer reused on every call, copy it to keep it.
+        """
+        # scalar maths, the arrays are too small for numpy calls to pay off
+        dx = kp2[0] - kp0[0]
+        dy = kp2[1] - kp0[1]
+        scale = dist / math.hypot(dx, dy)
+        dx *= scale
+        dy *= scale
+        triangle = self._triangle_buf
+        triangle[0] = kp2
+        triangle[1, 0] = kp2[0] + dx
+        triangle[1, 1] = kp2[1] + dy
+        # direction vector rotated by 90°
+        triangle[2, 0] = kp2[0] + dy
+        triangle[2, 1] = kp2[1] - dx
+        return triangle
 
     @staticmethod
     def _triangle_to_bbox(source):
         # plain old vector arithmetics
-        bbox = np.c_[
-            [source[2] - source[0] + source[1]],
-            [source[1] + source[0] - source[2]],
-            [3 * source[0] - source[1] - source[2]],
-            [source[2] - source[1] + source[0]],
-        ].reshape(-1, 2)
+        s0, s1, s2 = source
+        bbox = np.empty((4, 2), dtype=np.float32)
+        bbox[0] = s2 - s0 + s1
+        bbox[1] = s1 + s0 - s2
+        bbox[2] = 3 * s0 - s1 - s2
+        bbox[3] = s2 - s1 + s0
         return bbox
 
     @staticmethod
-    def _im_normalize(img):
-        return np.ascontiguousarray(
-            2 * ((img / 255) - 0.5
-                 ).astype('float32'))
+    def _im_normalize(img, out):
+        """maps uint8 [0, 255] to float32 [-1, 1] in place, without temporary arrays"""
+        # out is always the interpreter's input tensor, so no np.ascontiguousarray copy is needed
+        assert out.flags['C_CONTIGUOUS'], "out must be C contiguous"
+        np.multiply(img, np.float32(2 / 255), out=out)
+        np.subtract(out, np.float32(1), out=out)
+        return out
 
     @staticmethod
     def _sigm(x):
         return 1 / (1 + np.exp(-x))
 
-    @staticmethod
-    def _pad1(x):
-        return np.pad(x, ((0, 0), (0, 1)), constant_values=1, mode='constant')
-
-    def detect_hand(self, img_norm):
-        assert -1 <= img_norm.min() and img_norm.max() <= 1,\
-            "img_norm should be in range [-1, 1]"
-        assert img_norm.shape == (256, 256, 3),\
-            "img_norm shape must be (256, 256, 3)"
+    def detect_hand(self):
+        """
+        runs the palm model on the input tensor filled in by preprocess_img.
+        Returns (source triangle, keypoints, debug_info), both arrays are buffers
+        reused on every call, callers must copy them to keep them across frames.
+        """
+        if __debug__:
+            # metadata only, scanning the values for their range would cost two passes per frame
+            img_norm = self._in_tensor()[0]
+            assert img_norm.dtype == np.float32 and img_norm.shape == (256, 256, 3),\
+                "img_norm must be a (256, 256, 3) float32 tensor"
+            del img_norm
 
         # predict hand location and 7 initial landmarks
-        self.interp_palm.set_tensor(self.in_idx, img_norm[None])
         self.interp_palm.invoke()
 
         """
@@ -119,42 +208,33 @@ class BlazePalm():
         Second dimension 0 - 4 are bounding box offset, width and height: dx, dy, w ,h
         Second dimension 4 - 18 are 7 hand keypoint x and y coordinates: x1,y1,x2,y2,...x7,y7
         """
-        out_reg = self.interp_palm.get_tensor(self.out_reg_idx)[0]
+        out_reg = self._reg_tensor()[0]
         """
         out_clf shape is [number of anchors]
         it is the classification score if there is a hand for each anchor box
         """
-        out_clf = self.interp_palm.get_tensor(self.out_clf_idx)[0, :, 0]
-
-        # finding the best prediction
-        probabilities = self._sigm(out_clf)
-        detecion_mask = probabilities > CONFINDENCE_THRESHOLD 
-        candidate_detect = out_reg[detecion_mask]
-        candidate_anchors = self.anchors[detecion_mask]
-        probabilities = probabilities[detecion_mask]
+        out_clf = self._clf_tensor()[0, :, 0]
 
-        if candidate_detect.shape[0] == 0:
+        # Pick the most probable detected hand. Non maximum suppression always keeps
+        # that box first, so it's only needed when adapting for multi hand recognition
+        # (see dependencies/non_maximum_suppression.py, boxes must be moved by their anchors).
+        # Sigmoid is monotonic so the best raw score is also the most probable anchor,
+        # and the threshold only has to be checked (in logit space) for that one anchor
+        box_id = np.argmax(out_clf)
+        if out_clf[box_id] <= CONFINDENCE_LOGIT_THRESHOLD:
             print("No hands found")
+            self.last_confidence = 0.
             return None, None, None
+        self.last_confidence = self._sigm(out_clf[box_id])
 
-        # Pick the best bounding box with non maximum suppression
-        # the boxes must be moved by the corresponding anchor first
-        moved_candidate_detect = candidate_detect.copy()
-        moved_candidate_detect[:, :2] = candidate_detect[:,
-                                                         :2] + (candidate_anchors[:, :2] * 256)
-        box_ids = non_max_suppression_fast(
-            moved_candidate_detect[:, :4], probabilities)
-
-        # Pick the first detected hand. Could be adapted for multi hand recognition
-        box_ids = box_ids[0]
+        detection = out_reg[box_id]
 
         # bounding box offsets, width and height
-        dx, dy, w, h = candidate_detect[box_ids, :4]
-        center_wo_offst = candidate_anchors[box_ids, :2] * 256
+        dx, dy, w, h = detection[:4]
+        center_wo_offst = self._anchor_centers[box_id]
 
         # 7 initial keypoints
-        keypoints = center_wo_offst + \
-            candidate_detect[box_ids, 4:].reshape(-1, 2)
+        keypoints = np.add(detection[4:].reshape(7, 2), center_wo_offst, out=self._kp_buf)
         side = max(w, h) * self.box_enlarge
 
         # now we need to move and rotate the detected hand for it to occupy a
@@ -163,53 +243,103 @@ class BlazePalm():
         # should point straight up
         # TODO: replace triangle with the bbox directly
         source = self._get_triangle(keypoints[0], keypoints[2], side)
-        source -= (keypoints[0] - keypoints[2]) * self.box_shift
+        shift = np.subtract(keypoints[0], keypoints[2], out=self._shift_buf)
+        shift *= self.box_shift
+        source -= shift
 
-        debug_info = {
-            "detection_candidates": candidate_detect,
-            "anchor_candidates": candidate_anchors,
-            "selected_box_id": box_ids,
-        }
+        debug_info = None
+        if self.debug:
+            candidate_ids = np.flatnonzero(out_clf > CONFINDENCE_LOGIT_THRESHOLD)
+            debug_info = {
+                "detection_candidates": out_reg[candidate_ids],
+                "anchor_candidates": self.anchors[candidate_ids],
+                "selected_box_id": np.flatnonzero(candidate_ids == box_id)[0],
+            }
 
         return source, keypoints, debug_info
 
     def preprocess_img(self, img):
-        # fit the image into a 256x256 square
-        shape = np.r_[img.shape]
-        pad = (shape.max() - shape[:2]).astype('uint32') // 2
-        img_pad = np.pad(
-            img,
-            ((pad[0], pad[0]), (pad[1], pad[1]), (0, 0)),
-            mode='constant')
-        img_small = cv2.resize(img_pad, (256, 256))
-        img_small = np.ascontiguousarray(img_small)
-        img_norm = self._im_normalize(img_small)
-        return img_pad, img_norm, pad
+        """
+        Fits the BGR image into the 256x256 RGB input tensor, padding the shorter side.
+        Returns the 2x3 letterbox transform from img to input tensor coords.
+        """
+        height, width = img.shape[:2]
+        scale = 256 / max(height, width)
+        # centres the image with pixel centres aligned the same way as cv2.resize does
+        letterbox = np.float32([
+            [scale, 0, (255 - (width - 1) * scale) / 2],
+            [0, scale, (255 - (height - 1) * scale) / 2],
+        ])
+        # padding and resizing in a single pass
+        cv2.warpAffine(img, letterbox, (256, 256), dst=self._resize_buf,
+                       flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+        # the palm model expects RGB, reversing the channel axis is just a strided view
+        img_small = self._resize_buf[..., ::-1]
+        # normalize straight into the interpreter's input tensor
+        self._im_normalize(img_small, self._in_tensor()[0])
+        return letterbox
 
     def pred_bbox(self, img):
-        img_pad, img_norm, pad = self.preprocess_img(img)
-        source, keypoints, _ = self.detect_hand(img_norm)
+        letterbox = self.preprocess_img(img)
+        source, keypoints, _ = self.detect_hand()
         if source is None:
             return None
-        # calculating transformation from img_pad coords
+        # moving the triangle from input tensor coords back to img coords
+        inv_letterbox = cv2.invertAffineTransform(letterbox)
+        source = source @ inv_letterbox[:, :2].T + inv_letterbox[:, 2]
+        # calculating transformation from img coords
         # to img_landmark coords (cropped hand image)
-        scale = max(img.shape) / 256
         Mtr = cv2.getAffineTransform(
-            source * scale,
+            source,
             self._target_triangle
         )
-        # adding the [0,0,1] row to make the matrix square
-        Mtr = self._pad1(Mtr.T).T
-        Mtr[2, :2] = 0
-        Minv = np.linalg.inv(Mtr)
+        # closed form inverse of the 2x3 affine matrix
+        Minv = cv2.invertAffineTransform(Mtr)
         # projecting keypoints back into original image coordinate space
-        box_orig = (self._target_box @ Minv.T)[:, :2]
-        box_orig -= pad[::-1]
+        box_orig = self._target_box @ Minv[:, :2].T + Minv[:, 2]
         return box_orig
     
+    @staticmethod
+    def _bbox_roi(img, bbox):
+        """
+        Strided slices covering the axis aligned bounds of the bbox, clipped to img.
+        Returns None if the bbox lies outside of the image.
+        """
+        height, width = img.shape[:2]
+        x0, y0 = np.maximum(np.floor(bbox.min(axis=0)).astype(int), 0)
+        x1, y1 = np.ceil(bbox.max(axis=0)).astype(int)
+        x1, y1 = min(x1, width), min(y1, height)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        step = max(1, max(x1 - x0, y1 - y0) // ROI_SAMPLES)
+        return slice(y0, y1, step), slice(x0, x1, step)
+
+    def _is_tracking(self, img):
+        """
+        Checks if the cached bbox can be reused instead of running the palm model,
+        i.e. it was confidently detected recently and the image inside it hasn't changed much since.
+        """
+        if self.last_bbox is None or self.last_confidence <= TRACKING_THRESHOLD:
+            return False
+        if self._frames_since_detection >= self.redetect_interval or self._last_roi is None:
+            return False
+        patch = img[self._last_roi].astype(np.int16)
+        motion = np.abs(patch - self._last_patch).mean()
+        return motion < MOTION_THRESHOLD
+
     def __call__(self, img):
-        bbox = self.pred_bbox(img)
-        return bbox
+        if self._is_tracking(img):
+            self._frames_since_detection += 1
+            return self.last_bbox
+        self.last_bbox = self.pred_bbox(img)
+        self._frames_since_detection = 0
+        # motion is only measured where the hand is, so it isn't diluted by the background
+        self._last_roi = None
+        if self.last_bbox is not None:
+            self._last_roi = self._bbox_roi(img, self.last_bbox)
+        if self._last_roi is not None:
+            self._last_patch = img[self._last_roi].astype(np.int16)
+        return self.last_bbox
 
 if __name__ == '__main__':
     hand_tracker = BlazePalm()
@@ -221,8 +351,7 @@ if __name__ == '__main__':
     hasFrame, frame = capture.read()
     cv2.namedWindow(WINDOW)
     while hasFrame:
-        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        bbox = hand_tracker.pred_bbox(image)
+        bbox = hand_tracker.pred_bbox(frame)
         if bbox is not None:
             print('bbox', bbox)
             cv2.circle(frame, np.int32(bbox[0]), 8, (0,0,255))
@@ -6,62 +6,47 @@ def non_max_suppression_fast(boxes, probabilities=None, overlap_threshold=0.3):
     Algorithm to filter bounding box proposals by removing the ones with a too low confidence score
     and with too much overlap.
 
-    Source: https://www.pyimagesearch.com/2015/02/16/faster-non-maximum-suppression-python/
+    Source: https://github.com/rbgirshick/py-faster-rcnn/blob/master/lib/nms/py_cpu_nms.py
+    (originally https://www.pyimagesearch.com/2015/02/16/faster-non-maximum-suppression-python/)
 
-    :param boxes: List of proposed bounding boxes
-    :param overlap_threshold: the maximum overlap that is allowed
-    :return: filtered boxes
+    :param boxes: List of proposed bounding boxes (center x, center y, width, height)
+    :param overlap_threshold: the maximum IoU that is allowed
+    :return: indexes of the picked boxes, most probable first
     """
     # if there are no boxes, return an empty list
-    if boxes.shape[1] == 0:
+    if boxes.shape[0] == 0:
         return []
     # if the bounding boxes integers, convert them to floats --
     # this is important since we'll be doing a bunch of divisions
     if boxes.dtype.kind == "i":
         boxes = boxes.astype("float")
-    # initialize the list of picked indexes
-    pick = []
     # grab the coordinates of the bounding boxes
-    x1 = boxes[:, 0] - (boxes[:, 2] / [2])  # center x - width/2
-    y1 = boxes[:, 1] - (boxes[:, 3] / [2])  # center y - height/2
-    x2 = boxes[:, 0] + (boxes[:, 2] / [2])  # center x + width/2
-    y2 = boxes[:, 1] + (boxes[:, 3] / [2])  # center y + height/2
-
-    # compute the area of the bounding boxes and grab the indexes to sort
-    # (in the case that no probabilities are provided, simply sort on the
-    # bottom-left y-coordinate)
-    area = boxes[:, 2] * boxes[:, 3]  # width * height
-    idxs = y2
-
+    x1 = boxes[:, 0] - (boxes[:, 2] / 2)  # center x - width/2
+    y1 = boxes[:, 1] - (boxes[:, 3] / 2)  # center y - height/2
+    x2 = boxes[:, 0] + (boxes[:, 2] / 2)  # center x + width/2
+    y2 = boxes[:, 1] + (boxes[:, 3] / 2)  # center y + height/2
+
+    # compute the area of the bounding boxes once
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    # sort the boxes by probability, highest first (in the case that no
+    # probabilities are provided, simply sort on the bottom-left y-coordinate)
+    scores = probabilities if probabilities is not None else y2
+    order = np.argsort(scores)[::-1]
 
-    # if probabilities are provided, sort on them instead
-    if probabilities is not None:
-        idxs = probabilities
-
-    # sort the indexes
-    idxs = np.argsort(idxs)
-    # keep looping while some indexes still remain in the indexes
-    # list
-    while len(idxs) > 0:
-        # grab the last index in the indexes list and add the
-        # index value to the list of picked indexes
-        last = len(idxs) - 1
-        i = idxs[last]
+    pick = []
+    while order.size > 0:
+        # the most probable remaining box is always kept
+        i = order[0]
         pick.append(i)
-        # find the largest (x, y) coordinates for the start of
-        # the bounding box and the smallest (x, y) coordinates
-        # for the end of the bounding box
-        xx1 = np.maximum(x1[i], x1[idxs[:last]])
-        yy1 = np.maximum(y1[i], y1[idxs[:last]])
-        xx2 = np.minimum(x2[i], x2[idxs[:last]])
-        yy2 = np.minimum(y2[i], y2[idxs[:last]])
-        # compute the width and height of the bounding box
-        w = np.maximum(0, xx2 - xx1 + 1)
-        h = np.maximum(0, yy2 - yy1 + 1)
-        # compute the ratio of overlap
-        overlap = (w * h) / area[idxs[:last]]
-        # delete all indexes from the index list that have
-        idxs = np.delete(idxs, np.concatenate(([last],
-                                               np.where(overlap > overlap_threshold)[0])))
-    # return only the bounding boxes that were picked
+        # intersection of that box with all the remaining ones at once
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        w = np.maximum(0.0, xx2 - xx1 + 1)
+        h = np.maximum(0.0, yy2 - yy1 + 1)
+        inter = w * h
+        overlap = inter / (areas[i] + areas[order[1:]] - inter)
+        # keep only the boxes that don't overlap the picked one too much
+        order = order[np.where(overlap <= overlap_threshold)[0] + 1]
     return pick
@@ -94,11 +94,10 @@ class YOLO:
         return iw, ih, inference_time, results
 
 
-    def __call__(self, rgb_frame: np.ndarray) -> Union[np.ndarray, None]:
+    def __call__(self, bgr_frame: np.ndarray) -> Union[np.ndarray, None]:
         """
         For now it will track 1 hand only.
         """
-        bgr_frame = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2BGR)
         width, height, inference_time, results = self.inference(bgr_frame)
         # sort by confidence
         results.sort(key=lambda x: x[2])
@@ -1,3 +1,4 @@
+import cv2
 import mediapipe as mp
 import numpy as np
 
@@ -16,13 +17,16 @@ class MediaPipeE2E:
                 min_tracking_confidence=0.5) 
 
     def __call__(self, image: np.ndarray) -> np.ndarray:
+        # MediaPipe expects RGB, the BGR image is only used for drawing
+        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         # To improve performance, optionally mark the image as not writeable to
         # pass by reference.
-        image.flags.writeable = False
-        results = self.hands.process(image)
-        # Draw the hand annotations on the image.
-        image.flags.writeable = True
+        rgb_image.flags.writeable = False
+        results = self.hands.process(rgb_image)
+        # Draw the hand annotations on a copy, the camera frame
+        # itself can be handed out again if no newer one has arrived.
         if results.multi_hand_landmarks:
+            image = image.copy()
             for hand_landmarks in results.multi_hand_landmarks:
                 self._mp_drawing.draw_landmarks(
                     image,